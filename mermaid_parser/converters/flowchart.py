@@ -1,6 +1,9 @@
+from typing import TYPE_CHECKING
 from mermaid.flowchart import FlowChart, Node, Link
 from mermaid_parser.parser import MermaidParser
-import networkx as nx
+
+if TYPE_CHECKING:
+    import networkx as nx
 
 NODE_SHAPE_MAP = {
     "square": "normal",
@@ -77,12 +80,22 @@ class FlowChartConverter:
             head_right=head_right,
         )
 
-    def to_networkx(self, flowchart: FlowChart) -> nx.DiGraph:
+    def to_networkx(self, flowchart: FlowChart) -> "nx.DiGraph":
+        # networkx is only needed here, so keep it off the import path of the module
+        import networkx as nx
+
+        # Build the graph with one bulk call each for nodes and edges
         G = nx.DiGraph()
-        for node in flowchart.nodes.values():
-            G.add_node(node.id, content=node.content, shape=node.shape)
-        for link in flowchart.links:
-            G.add_edge(
-                link.origin.id, link.end.id, shape=link.shape, message=link.message
+        G.add_nodes_from(
+            (node.id_, {"content": node.content, "shape": node.shape})
+            for node in flowchart.nodes
+        )
+        G.add_edges_from(
+            (
+                link.origin.id_,
+                link.end.id_,
+                {"shape": link.shape, "message": link.message},
             )
+            for link in flowchart.links
+        )
         return G
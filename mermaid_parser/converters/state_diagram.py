@@ -7,8 +7,12 @@ from mermaid_parser.structs.state_diagram import (
 from mermaid.statediagram.state import Composite, Concurrent, End, Start, State
 from mermaid.statediagram.transition import Choice, Fork, Join, Transition
 from mermaid_parser import MermaidParser
-import networkx as nx
+from collections import defaultdict, deque
+import bisect
+import multiprocessing
+import os
 import re
+import sys
 
 """
 Currently, this class gives basic support for converting flat state diagrams with notes.
@@ -25,32 +29,138 @@ Supports:
 """
 
 
+# Suffixes the parser gives to start/end pseudo-state ids ("<scope>_start", "<scope>_end")
+_SENTINEL_SUFFIXES = ("_start", "_end")
+
+
+def _is_sentinel(state_id: str) -> bool:
+    """Return True if the id names a start/end pseudo-state."""
+    return state_id.endswith(_SENTINEL_SUFFIXES)
+
+
+def _state_kind(state_info: dict) -> str:
+    """
+    Classify a parsed state item as "start", "end", "composite" or "state".
+
+    The parser names start/end pseudo-states "<scope>_start" / "<scope>_end",
+    so only the id's suffix needs checking.
+    """
+    state_id = state_info["id"]
+    if state_id.endswith("_start"):
+        return "start"
+    if state_id.endswith("_end"):
+        return "end"
+    return "composite" if "doc" in state_info else "state"
+
+
+# Constructor for each state kind, called with (state_id, content)
+_STATE_CONSTRUCTORS = {
+    "start": lambda state_id, content: Start(),
+    "end": lambda state_id, content: End(),
+    # Sub-states and transitions are populated during nested processing
+    "composite": lambda state_id, content: Composite(
+        id_=state_id, content=content, sub_states=[], transitions=[]
+    ),
+    "state": lambda state_id, content: State(id_=state_id, content=content),
+}
+
+
+class _LevelFrame:
+    """
+    Work item for one doc level: the root, a composite state body or a parallel region.
+    Holds the level's own states and the steps still to run once its declarations are done.
+
+    Notes and transitions of all levels go straight into accumulators shared with the
+    root frame, in the order they are produced; a level's subtree is the tail of each
+    accumulator from the offsets recorded when the level was opened.
+    """
+
+    def __init__(
+        self,
+        parent_id: str = None,
+        parent_path: tuple[str, ...] = None,
+        region: tuple[int, dict] = None,
+        outer: "_LevelFrame" = None,
+    ) -> None:
+        self.parent_id = parent_id
+        self.parent_path = parent_path
+        self.region = region  # (index, divider item) for parallel regions
+        self.states: dict[str, State] = {}
+        if outer is None:
+            # The root level owns the accumulators; levels holds the states
+            # dict of every level in the order the levels were opened
+            self.levels: list[dict[str, State]] = []
+            self.notes: list[Note] = []
+            self.transitions: list[Transition] = []
+        else:
+            self.levels = outer.levels
+            self.notes = outer.notes
+            self.transitions = outer.transitions
+        self.start = (len(self.levels), len(self.notes), len(self.transitions))
+        self.levels.append(self.states)
+        self.parallel_info: list[dict] = []
+        self.steps: deque[tuple] = deque()
+
+
 class StateDiagramConverter:
-    def __init__(self):
+    # graph_type values reported by the parser for state diagrams (v1 and v2)
+    _GRAPH_TYPES = frozenset({"stateDiagram", "stateDiagram-v2"})
+    # Ids marking the source of an initial transition, besides "<scope>_start"
+    _INITIAL_MARKERS = frozenset({"[*]", "root_start"})
+    # Patterns to detect history state notes with explicit target, in priority order.
+    # They are combined into one anchored alternation: each branch scans lazily from the
+    # start of the note, so the first branch that matches anywhere wins, exactly as when
+    # searching with each pattern in turn. The match's last group is the target.
+    _HISTORY_PATTERN = re.compile(
+        r"^(?:"
+        r".*?(?:transitions?\s+to|returns?\s+to|resumes?\s+to?)\s+(\w+)\s+history\s+state"
+        r"|.*?(\w+)\s+history\s+state"
+        r"|.*?history\s+state\s+(?:of\s+)?(\w+)"
+        r")",
+        re.IGNORECASE | re.DOTALL,
+    )
+    # Cheap gate run before the extraction pattern, without lowercasing the note
+    _HISTORY_WORD = re.compile("history", re.IGNORECASE)
+
+    def __init__(self) -> None:
         self.parser = MermaidParser()
         self.history_states = {}  # Maps composite state ID -> HistoryState object
         self.history_transitions = (
             {}
         )  # Maps (from_state, trigger) -> target_composite_state for history
+        # Reverse index of all_states: state id_ -> keys holding a state with that id_
+        self._id_index: dict[str, list[tuple[str, ...]]] = defaultdict(list)
+        # Memoized _find_state_in_all_states results, valid until all_states changes
+        self._find_cache: dict[tuple, tuple[State, tuple[str, ...]]] = {}
+        # Transitions grouped by source id as they are emitted, with their position in
+        # the diagram's transition list and whether their label is resume-like
+        self._transitions_by_from: dict[str, list[tuple[int, bool, Transition]]] = {}
+        # Ascending positions of the transitions leaving a start state
+        self._start_positions: list[int] = []
 
     def convert(self, mermaid_text: str) -> StateDiagramWithNote:
         # Reset history state tracking for each conversion
         self.history_states = {}
         self.history_transitions = {}
+        self._id_index = defaultdict(list)
+        self._find_cache = {}
+        self._transitions_by_from = {}
+        self._start_positions = []
 
         # TODO: the current parser does not handle rendering styles
         parsed_data = self.parser.parse(mermaid_text)
         graph_type = parsed_data.get("graph_type")
-        if "stateDiagram" not in graph_type:
+        if graph_type not in self._GRAPH_TYPES:
             raise ValueError(f"Unsupported graph type: {graph_type}")
 
+        root_doc = parsed_data["graph_data"]["rootDoc"]
+        self._intern_strings(root_doc)
+
         all_states = {}
-        states, transitions, notes = self._convert_state_diagram(
-            parsed_data["graph_data"]["rootDoc"], all_states
-        )
+        states, transitions, notes = self._convert_state_diagram(root_doc, all_states)
 
         # Process notes to detect history state indicators and create history states
-        self._process_history_notes(notes, all_states, transitions)
+        self._process_history_notes(notes, all_states)
 
         # Add history states to the states list
         for history_state in self.history_states.values():
@@ -58,6 +168,7 @@ class StateDiagramConverter:
 
         # Extract initial states from transitions
         root_initial_state, initial_states = self._extract_initial_states(transitions)
+        states_by_id, children_by_parent = self._index_states(states)
 
         result = StateDiagramWithNote(
             title="State Diagram",
@@ -67,6 +178,8 @@ class StateDiagramConverter:
             version="v2",
             root_initial_state=root_initial_state,
             initial_states=initial_states,
+            states_by_id=states_by_id,
+            children_by_parent=children_by_parent,
         )
 
         # Attach history state info to the result for consumers
@@ -75,7 +188,66 @@ class StateDiagramConverter:
 
         return result
 
-    def _extract_initial_states(self, transitions: list) -> tuple:
+    def convert_many(
+        self, mermaid_texts: list[str], workers: int = None
+    ) -> list[StateDiagramWithNote]:
+        """
+        Convert several independent diagrams, in parallel worker processes.
+
+        Args:
+            mermaid_texts: Mermaid sources of the diagrams to convert
+            workers: Number of worker processes, defaults to
+                min(len(mermaid_texts), CPU count). Each worker is a spawned
+                interpreter that imports pythonmonkey and loads the JS parser
+                before converting anything, so small batches are usually faster
+                with 1 worker, which converts the diagrams in this process
+
+        Returns:
+            The converted diagrams, in the order of mermaid_texts
+        """
+        # Never start more workers than there are diagrams to convert
+        workers = min(workers or os.cpu_count() or 1, len(mermaid_texts))
+        if workers <= 1:
+            return [self.convert(text) for text in mermaid_texts]
+
+        # Spawned workers each load their own JS runtime and converter
+        context = multiprocessing.get_context("spawn")
+        with context.Pool(workers, initializer=_init_worker) as pool:
+            chunksize = max(1, len(mermaid_texts) // (workers * 4))
+            return pool.map(_convert_in_worker, mermaid_texts, chunksize)
+
+    def _index_states(
+        self, states: list[State]
+    ) -> tuple[dict[str, list[State]], dict[str, list[State]]]:
+        """
+        Index the converted states by id and by parent, skipping start/end markers.
+        An id can name several states (e.g. the same id in two parallel regions),
+        so both indexes map to lists, in the order of the states list.
+
+        Args:
+            states: All converted states, history states included
+
+        Returns:
+            Tuple of (states_by_id, children_by_parent); root states are under None
+        """
+        states_by_id = {}
+        children_by_parent = {}
+        for state in states:
+            if isinstance(state, (Start, End)):
+                continue
+            states_by_id.setdefault(state.id_, []).append(state)
+            children_by_parent.setdefault(getattr(state, "parent_id", None), []).append(
+                state
+            )
+        return states_by_id, children_by_parent
+
+    def _is_initial_marker(self, state_id: str) -> bool:
+        """Return True if transitions from this id are initial transitions."""
+        return state_id in self._INITIAL_MARKERS or state_id.endswith("_start")
+
+    def _extract_initial_states(
+        self, transitions: list[Transition]
+    ) -> tuple[str | None, dict[str, str]]:
         """
         Extract initial states from transitions.
 
@@ -91,17 +263,12 @@ class StateDiagramConverter:
         initial_states = {}  # parent_id -> initial_state_id
 
         for transition in transitions:
-            from_state = getattr(transition, "from_state", None)
-            to_state = getattr(transition, "to_state", None)
-
-            if not from_state or not to_state:
-                continue
-
-            from_id = getattr(from_state, "id_", None)
-            to_id = getattr(to_state, "id_", None)
+            to_state = transition.to_state
+            from_id = transition.from_state.id_
+            to_id = to_state.id_
 
             # Check if this is an initial state transition ([*] or _start)
-            if from_id in ["root_start", "[*]"] or (from_id and "_start" in from_id):
+            if from_id and self._is_initial_marker(from_id):
                 to_parent = getattr(to_state, "parent_id", None)
 
                 if to_parent is None:
@@ -118,7 +285,9 @@ class StateDiagramConverter:
         return root_initial_state, initial_states
 
     def _process_history_notes(
-        self, notes: list, all_states: dict, transitions: list
+        self,
+        notes: list[Note],
+        all_states: dict[tuple[str, ...], State],
     ) -> None:
         """
         Process notes to detect history state indicators.
@@ -130,88 +299,77 @@ class StateDiagramConverter:
 
         Creates HistoryState objects for composite states that have history transitions.
         """
-        # Patterns to detect history state notes with explicit target
-        history_patterns = [
-            r"(?:transitions?\s+to|returns?\s+to|resumes?\s+to?)\s+(\w+)\s+history\s+state",
-            r"(\w+)\s+history\s+state",
-            r"history\s+state\s+(?:of\s+)?(\w+)",
-        ]
-
-        # Build a map of state -> parent composite for inferring history targets
+        # Notes that indicate a history state; most diagrams have none, in which
+        # case the lookup tables are not built at all
+        has_history = self._HISTORY_WORD.search
+        history_notes = [note for note in notes if has_history(note.content)]
+        if not history_notes:
+            return
+
+        # Build a map of state -> parent composite for inferring history targets,
+        # and the reverse map of parent -> child ids (composites are its keys)
         state_to_parent = {}
-        for state_key, state in all_states.items():
+        children_by_parent: dict[str, list[str]] = {}
+        # Lowercased id -> first state id_ with that spelling, to normalize note targets
+        id_by_lower: dict[str, str] = {}
+        for state in all_states.values():
+            id_by_lower.setdefault(state.id_.lower(), state.id_)
             parent_id = getattr(state, "parent_id", None)
+            children_by_parent.setdefault(parent_id, []).append(state.id_)
             if parent_id:
-                state_id = getattr(state, "id_", state_key)
-                state_to_parent[state_id] = parent_id
+                state_to_parent[state.id_] = parent_id
 
-        for note in notes:
-            note_text = note.content.lower()
+        transitions_by_from = self._transitions_by_from
+
+        for note in history_notes:
             logger.debug(
-                f"Processing note: '{note.content}' on state: {getattr(note.target_state, 'id_', 'unknown')}"
+                f"Found history note: '{note.content}' on state: {note.target_state.id_}"
             )
 
-            # Check if this note indicates a history state
-            if "history" not in note_text:
-                continue
-
-            logger.debug(f"Found history note: '{note.content}'")
-
             # Try to extract the target composite state name from the note text
-            target_composite = None
-            for pattern in history_patterns:
-                match = re.search(pattern, note_text, re.IGNORECASE)
-                if match:
-                    target_composite = match.group(1)
-                    break
+            match = self._HISTORY_PATTERN.match(note.content)
+            target_composite = match.group(match.lastindex) if match else None
 
             # Get the source state (note is attached to it)
-            source_state = note.target_state
-            source_id = getattr(source_state, "id_", None) if source_state else None
+            source_id = note.target_state.id_
 
             # Build list of states to check for transitions (source + its children)
-            states_to_check = [source_id] if source_id else []
+            states_to_check: set[str] = {source_id} if source_id else set()
             # Add children of the source state (note might be on a composite containing the actual source)
-            for state_key, state in all_states.items():
-                parent = getattr(state, "parent_id", None)
-                if parent == source_id:
-                    child_id = getattr(state, "id_", state_key)
-                    states_to_check.append(child_id)
+            states_to_check.update(children_by_parent.get(source_id, ()))
+            # Transitions leaving any of those states, in their original order
+            candidates = sorted(
+                (position, from_id, is_resume, transition)
+                for from_id in states_to_check
+                for position, is_resume, transition in transitions_by_from.get(
+                    from_id, ()
+                )
+            )
 
             # If no explicit target found, infer from context
             if not target_composite and states_to_check:
                 # Find transitions FROM the source state or its children with "resume" in the label
-                for transition in transitions:
-                    from_state = getattr(transition, "from_state", None)
-                    from_id = getattr(from_state, "id_", None) if from_state else None
-
-                    if from_id in states_to_check:
-                        label = getattr(transition, "label", "") or ""
-                        # Check if this is a resume-like transition
-                        if "resume" in label.lower():
-                            to_state = getattr(transition, "to_state", None)
-                            to_id = getattr(to_state, "id_", None) if to_state else None
-
-                            if to_id:
-                                # The target composite could be:
-                                # 1. The destination itself if it's a composite state
-                                # 2. The parent of the destination state
-                                # Check if destination is a composite (has children)
-                                dest_is_composite = any(
-                                    getattr(s, "parent_id", None) == to_id
-                                    for s in all_states.values()
+                for _, from_id, is_resume, transition in candidates:
+                    # Check if this is a resume-like transition
+                    if is_resume:
+                        to_id = transition.to_state.id_
+
+                        if to_id:
+                            # The target composite could be:
+                            # 1. The destination itself if it's a composite state
+                            # 2. The parent of the destination state
+                            # Check if destination is a composite (has children)
+                            if to_id in children_by_parent:
+                                target_composite = to_id
+                                logger.debug(
+                                    f"Inferred history target '{target_composite}' (composite destination) from transition {from_id} -> {to_id}"
+                                )
+                            elif to_id in state_to_parent:
+                                target_composite = state_to_parent[to_id]
+                                logger.debug(
+                                    f"Inferred history target '{target_composite}' from transition {from_id} -> {to_id}"
                                 )
-                                if dest_is_composite:
-                                    target_composite = to_id
-                                    logger.debug(
-                                        f"Inferred history target '{target_composite}' (composite destination) from transition {from_id} -> {to_id}"
-                                    )
-                                elif to_id in state_to_parent:
-                                    target_composite = state_to_parent[to_id]
-                                    logger.debug(
-                                        f"Inferred history target '{target_composite}' from transition {from_id} -> {to_id}"
-                                    )
-                                break
+                            break
 
             if not target_composite:
                 logger.warning(
@@ -222,14 +380,7 @@ class StateDiagramConverter:
             logger.debug(f"History target identified: '{target_composite}'")
 
             # Normalize the target composite name (case-insensitive lookup)
-            actual_composite = None
-            for state_key, state in all_states.items():
-                if (
-                    hasattr(state, "id_")
-                    and state.id_.lower() == target_composite.lower()
-                ):
-                    actual_composite = state.id_
-                    break
+            actual_composite = id_by_lower.get(target_composite.lower())
 
             if not actual_composite:
                 logger.warning(
@@ -247,33 +398,19 @@ class StateDiagramConverter:
             # Find and update the transition that goes to history
             # Check transitions from source state AND its children
             if states_to_check:
-                for transition in transitions:
-                    from_state = getattr(transition, "from_state", None)
-                    from_id = getattr(from_state, "id_", None) if from_state else None
-
-                    if from_id not in states_to_check:
-                        continue
-
-                    to_state = getattr(transition, "to_state", None)
-                    to_id = getattr(to_state, "id_", None) if to_state else None
-                    label = getattr(transition, "label", "") or ""
+                for _, from_id, is_resume, transition in candidates:
+                    to_id = transition.to_state.id_
+                    label = transition.label or ""
 
                     # Check if this transition should go to history:
                     # - destination IS the target composite, OR
                     # - destination is inside the target composite, OR
                     # - label contains "resume"
-                    is_history_trans = False
-                    if to_id:
-                        # Check if destination is or is inside the composite
-                        if to_id == actual_composite:
-                            is_history_trans = True
-                        elif state_to_parent.get(to_id) == actual_composite:
-                            is_history_trans = True
-                        # Also check for resume transitions
-                        if "resume" in label.lower():
-                            is_history_trans = True
-
-                    if is_history_trans:
+                    if to_id and (
+                        is_resume
+                        or to_id == actual_composite
+                        or state_to_parent.get(to_id) == actual_composite
+                    ):
                         # Mark this transition as going to history
                         trigger = label or "auto"
                         self.history_transitions[(from_id, trigger)] = actual_composite
@@ -287,174 +424,224 @@ class StateDiagramConverter:
     def _convert_states_and_notes(
         self,
         root_doc: list[dict],
-        all_states: dict[str, State],
+        all_states: dict[tuple[str, ...], State],
         parent_id: str = None,
-        parent_path: str = None,
-    ) -> tuple[dict[str, State], list[Note], list[Transition]]:
+        parent_path: tuple[str, ...] = None,
+    ) -> tuple[list[Note], list[Transition]]:
         """
         Extract and convert states, notes, and transitions from parsed state diagram data.
 
-        Three-pass approach to correctly handle state hierarchy:
-        1. First pass: Process state declarations (but not their nested content yet)
-        2. Second pass: Process transitions at this level (now all states at this level are known)
-        3. Third pass: Recursively process nested content of composite states
+        Each doc level (the root, a composite state body or a parallel region) is
+        handled in passes to correctly resolve the state hierarchy:
+        1. Process state declarations (but not their nested content yet)
+        2. Process transitions at this level and the nested content of composite
+           states - nested content first at root level, transitions first otherwise
+        3. Process divider regions (parallel states)
+
+        Nested levels are processed with an explicit stack of frames rather than
+        recursion, so deep hierarchies cost no extra Python call frames.
 
         Args:
             root_doc: List of parsed state diagram elements
-            all_states: Dictionary to store all states by id
+            all_states: Dictionary to store all states by scoped key
             parent_id: ID of the parent state (for nested states) - this is the simple parent, e.g. 'Print'
-            parent_path: Full hierarchical path to parent, e.g. 'On_LoggedIn_Print' - used for scoped keys
+            parent_path: Full hierarchical path to parent, e.g. ('On', 'LoggedIn', 'Print') - used for scoped keys
 
         Returns:
-            Tuple of (states_dict, notes_list, transitions_list)
+            Tuple of (notes_list, transitions_list); states are stored in all_states
         """
         # If parent_path is not provided, use parent_id
-        if parent_path is None:
-            parent_path = parent_id
-        states = {}  # Dict to store states by id
-        notes = []  # List to store notes
-        transitions = []  # List to store transitions
-        composite_states = []  # Track composite states for third pass
-        divider_regions = []  # Track divider regions for parallel state handling
-
-        # PASS 1: Process state declarations and notes (but don't recurse into composite states yet)
-        for item in root_doc:
-            # Skip items that are strings (simple state declarations like "state ProgramComplete")
-            # These will be handled when they appear in transitions
-            if isinstance(item, str):
-                continue
-
-            if item["stmt"] == "state":
-                state_id = item["id"]
-
-                # Check if this is a divider (parallel region marker)
-                if item.get("type") == "divider":
-                    # Track divider regions for later processing
-                    divider_regions.append(item)
-                    continue
-
-                scoped_key = self._get_scoped_key(state_id, parent_path)
-
-                # Handle note items
-                if "note" in item:
-                    note_info = item["note"]
-                    # Find or create the target state
-                    if state_id not in states:
-                        state = self._create_state(
-                            item, parent_id, scoped_id=scoped_key
+        if parent_path is None and parent_id is not None:
+            parent_path = (parent_id,)
+
+        stack = [self._open_level(root_doc, all_states, parent_id, parent_path)]
+        while True:
+            frame = stack[-1]
+
+            if frame.steps:
+                step = frame.steps.popleft()
+                if step[0] == "transitions":
+                    level_transitions = self._convert_transitions(
+                        step[1],
+                        frame.states,
+                        all_states,
+                        frame.parent_id,
+                        frame.parent_path,
+                    )
+                    self._index_transitions(level_transitions, len(frame.transitions))
+                    frame.transitions.extend(level_transitions)
+                elif step[0] == "composite":
+                    _, comp_state_id, comp_item = step
+                    # Detach the nested doc so the parsed subtree can be freed once its
+                    # frame is done. The converter owns the parse result: parse() decodes
+                    # a fresh copy per call, which _intern_strings already edits in place
+                    comp_doc, comp_item["doc"] = comp_item["doc"], None
+                    new_parent_path = (frame.parent_path or ()) + (comp_state_id,)
+                    stack.append(
+                        self._open_level(
+                            comp_doc,
+                            all_states,
+                            comp_state_id,
+                            new_parent_path,
+                            outer=frame,
                         )
-                        if state:
-                            states[state_id] = state
-
-                    note = Note(
-                        content=note_info["text"],
-                        target_state=states[state_id],
-                        position=note_info["position"],
                     )
-                    notes.append(note)
                 else:
-                    # Handle regular state items and composite states
-                    if scoped_key not in all_states:
-                        state = self._create_state(
-                            item, parent_id, scoped_id=scoped_key
+                    # Parallel region: its states belong to the same parent, under a
+                    # parent path that includes the region identifier
+                    _, idx, divider = step
+                    region_parent_path = (frame.parent_path or ()) + (
+                        sys.intern(f"region_{idx}"),
+                    )
+                    # Detached the same way as a composite's doc
+                    region_doc, divider["doc"] = divider.get("doc", []), None
+                    stack.append(
+                        self._open_level(
+                            region_doc,
+                            all_states,
+                            frame.parent_id,
+                            region_parent_path,
+                            region=(idx, divider),
+                            outer=frame,
                         )
-                        if state:
-                            states[state_id] = state
-                            all_states[scoped_key] = state
-
-                            # If this is a composite state, save it for later processing
-                            if "doc" in item:
-                                composite_states.append((state_id, item["doc"]))
-                    else:
-                        # State already exists - just update description if provided
-                        description = item.get("description", "")
-                        if description and state_id in states:
-                            states[state_id].content = description
-
-        # PASS 2: Recursively process nested content FIRST if we're at root level
+                    )
+                continue
+
+            # All steps of this level are done
+            stack.pop()
+            if frame.parallel_info:
+                self._attach_parallel_regions(frame, all_states)
+            if not stack:
+                return frame.notes, frame.transitions
+
+            # Its notes and transitions are already in place; regions also
+            # report their contents to the level that opened them
+            if frame.region is not None:
+                stack[-1].parallel_info.append(self._build_region_info(frame))
+
+    def _open_level(
+        self,
+        root_doc: list[dict],
+        all_states: dict[tuple[str, ...], State],
+        parent_id: str = None,
+        parent_path: tuple[str, ...] = None,
+        region: tuple[int, dict] = None,
+        outer: _LevelFrame = None,
+    ) -> _LevelFrame:
+        """
+        Process the state declarations and notes of one doc level and schedule the rest.
+
+        Args:
+            root_doc: List of parsed state diagram elements at this level
+            all_states: Dictionary to store all states by scoped key
+            parent_id: ID of the parent state (for nested states)
+            parent_path: Full hierarchical path to parent - used for scoped keys
+            region: (index, divider item) when this level is a parallel region
+            outer: Frame of the level that opened this one (None for the top level)
+
+        Returns:
+            A frame holding this level's results and its remaining steps
+        """
+        frame = _LevelFrame(parent_id, parent_path, region, outer)
+        states = frame.states
+        notes = frame.notes
+        composite_states = []  # Track composite states for a later step
+
+        # Split the doc into state declarations, relations and divider regions once
+        state_items, relation_items, divider_regions = self._bucketize(root_doc)
+
+        # PASS 1: Process state declarations and notes (but don't recurse into composite states yet)
+        for item in state_items:
+            state_id = item["id"]
+            note_info = item.get("note")
+
+            scoped_key = self._get_scoped_key(state_id, parent_path)
+
+            # Handle note items
+            if note_info is not None:
+                # Find or create the target state
+                state = states.get(state_id)
+                if state is None:
+                    state = self._create_state(item, parent_id, scoped_id=scoped_key)
+                    states[state_id] = state
+
+                note = Note(
+                    content=note_info["text"],
+                    target_state=state,
+                    position=note_info["position"],
+                )
+                notes.append(note)
+            elif scoped_key not in all_states:
+                # Handle regular state items and composite states
+                state = self._create_state(item, parent_id, scoped_id=scoped_key)
+                states[state_id] = state
+                self._put_state(all_states, scoped_key, state)
+
+                # If this is a composite state, save it for later processing
+                if "doc" in item:
+                    composite_states.append(("composite", state_id, item))
+            else:
+                # State already exists - just update description if provided
+                description = item.get("description", "")
+                if description:
+                    state = states.get(state_id)
+                    if state is not None:
+                        state.content = description
+
+        # PASS 2: Process nested content FIRST if we're at root level
         # This ensures deeply nested states exist before root tries to reference them
         # For non-root levels, process transitions first (breadth-first within nested scopes)
         if parent_id is None:
-            # Root level: process nested scopes first
-            for comp_state_id, comp_doc in composite_states:
-                new_parent_path = (
-                    f"{parent_path}_{comp_state_id}" if parent_path else comp_state_id
-                )
-                nested_states, nested_notes, nested_transitions = (
-                    self._convert_states_and_notes(
-                        comp_doc,
-                        all_states,
-                        parent_id=comp_state_id,
-                        parent_path=new_parent_path,
-                    )
-                )
-                states.update(nested_states)
-                notes.extend(nested_notes)
-                transitions.extend(nested_transitions)
-
-            # Then process root-level transitions
-            level_transitions = self._convert_transitions(
-                root_doc, states, all_states, parent_id, parent_path
-            )
-            transitions.extend(level_transitions)
+            frame.steps.extend(composite_states)
+            frame.steps.append(("transitions", relation_items))
         else:
-            # Non-root level: process transitions first (breadth-first)
-            level_transitions = self._convert_transitions(
-                root_doc, states, all_states, parent_id, parent_path
-            )
-            transitions.extend(level_transitions)
+            frame.steps.append(("transitions", relation_items))
+            frame.steps.extend(composite_states)
 
-            # Then recursively process nested content
-            for comp_state_id, comp_doc in composite_states:
-                new_parent_path = (
-                    f"{parent_path}_{comp_state_id}" if parent_path else comp_state_id
-                )
-                nested_states, nested_notes, nested_transitions = (
-                    self._convert_states_and_notes(
-                        comp_doc,
-                        all_states,
-                        parent_id=comp_state_id,
-                        parent_path=new_parent_path,
-                    )
-                )
-                states.update(nested_states)
-                notes.extend(nested_notes)
-                transitions.extend(nested_transitions)
-
-        # PASS 4: Process divider regions (parallel states)
-        if divider_regions:
-            parallel_info = self._process_parallel_regions(
-                divider_regions, all_states, parent_id, parent_path
-            )
-            # Add the parallel region states and transitions
-            for region_data in parallel_info:
-                states.update(region_data["states"])
-                transitions.extend(region_data["transitions"])
-                notes.extend(region_data.get("notes", []))
-
-            # Mark the parent state as having parallel regions
-            # The parent state is in all_states, not the local states dict
-            if parent_id:
-                # Find the parent state in all_states (try both scoped and unscoped keys)
-                parent_state = all_states.get(parent_id)
-                if parent_state is None and parent_path:
-                    # Try with full path
-                    for key, state in all_states.items():
-                        if hasattr(state, "id_") and state.id_ == parent_id:
-                            parent_state = state
-                            break
+        # PASS 3: Process divider regions (parallel states)
+        for idx, divider in enumerate(divider_regions):
+            frame.steps.append(("region", idx, divider))
 
-                if parent_state:
-                    # Add parallel_regions attribute dynamically
-                    parent_state.parallel_regions = parallel_info
-                    logger.debug(
-                        f"Set parallel_regions on {parent_id}: {len(parallel_info)} regions"
-                    )
+        return frame
 
-        return states, notes, transitions
+    def _bucketize(
+        self, root_doc: list[dict]
+    ) -> tuple[list[dict], list[dict], list[dict]]:
+        """
+        Split a parsed doc into its state, relation and divider items in one pass.
+
+        Strings (simple declarations like "state ProgramComplete") and any other
+        statement types are dropped; states only referenced by name are created
+        when they appear in transitions.
+
+        Args:
+            root_doc: List of parsed state diagram elements
+
+        Returns:
+            Tuple of (state_items, relation_items, divider_items), each in doc order
+        """
+        state_items = []
+        relation_items = []
+        divider_items = []
+        for item in root_doc:
+            if isinstance(item, str):
+                continue
+            stmt = item["stmt"]
+            if stmt == "state":
+                # Dividers (parallel region markers) are state items with a divider type
+                if item.get("type") == "divider":
+                    divider_items.append(item)
+                else:
+                    state_items.append(item)
+            elif stmt == "relation":
+                relation_items.append(item)
+        return state_items, relation_items, divider_items
 
     def _create_state(
-        self, state_info: dict, parent_id: str = None, scoped_id: str = None
+        self,
+        state_info: dict,
+        parent_id: str = None,
+        scoped_id: tuple[str, ...] = None,
     ) -> State:
         """
         Create a State object from parsed state info.
@@ -462,92 +649,170 @@ class StateDiagramConverter:
         Args:
             state_info: Dictionary containing state information
             parent_id: ID of the parent state (if this is a nested state)
-            scoped_id: Full scoped identifier for the state (e.g., 'SpaManager_Sauna_Off')
+            scoped_id: Full scoped key for the state (e.g., ('SpaManager', 'Sauna', 'Off'))
 
         Returns:
             State, Start, End, Composite, or Concurrent object
         """
         state_id = state_info["id"]
-        if "_start" in state_id:
-            return Start()
-        elif "_end" in state_id:
-            return End()
-        else:
-            # Create state (regular or composite)
-            if "doc" in state_info:
-                # Composite state - we'll create a regular state for now
-                # The nested states will be processed separately
-                state = Composite(
-                    id_=state_id,
-                    content=state_info.get("description", ""),
-                    sub_states=[],  # Will be populated during recursive processing
-                    transitions=[],
-                )
-            else:
-                # Regular state
-                state = State(id_=state_id, content=state_info.get("description", ""))
+        kind = _state_kind(state_info)
+        state = _STATE_CONSTRUCTORS[kind](state_id, state_info.get("description", ""))
+        if kind in ("start", "end"):
+            # Pseudo-states keep their "[*]" id and carry no scope
+            return state
 
-            state.id_ = state_id
+        state.id_ = state_id
 
-            # Set parent_id if this state is nested
-            if parent_id is not None:
-                state.parent_id = parent_id
+        # Set parent_id if this state is nested
+        if parent_id is not None:
+            state.parent_id = parent_id
 
-            # Set scoped_id for unique identification across parallel regions
-            # This allows disambiguation of states with the same name in different scopes
-            state.scoped_id = scoped_id if scoped_id else state_id
+        # Set scoped_id for unique identification across parallel regions
+        # This allows disambiguation of states with the same name in different scopes
+        state.scoped_id = "_".join(scoped_id) if scoped_id else state_id
 
-            return state
+        return state
 
-    def _get_scoped_key(self, state_id: str, parent_id: str = None) -> str:
+    def _get_scoped_key(
+        self, state_id: str, parent_path: tuple[str, ...] = None
+    ) -> tuple[str, ...]:
         """
         Generate a scoped key for a state based on its ID and parent context.
         This allows multiple states with the same name in different scopes.
 
         Args:
             state_id: The state's ID
-            parent_id: The parent state's ID (if nested)
+            parent_path: The hierarchical path of the parent state (if nested)
 
         Returns:
-            A scoped key for the state
+            A scoped key for the state, e.g. ('On', 'LoggedIn', 'Idle')
+        """
+        if parent_path and not _is_sentinel(state_id):
+            return parent_path + (state_id,)
+        return (state_id,)
+
+    # Parsed fields that are hashed and compared over and over during conversion,
+    # plus note text/position, which repeat across notes and are kept by every Note
+    _INTERNED_FIELDS = ("id", "stmt", "type", "description", "text", "position")
+
+    def _intern_strings(self, root_doc: list[dict]) -> None:
+        """
+        Intern the identifier-like strings of the parsed document in place.
+
+        Ids are used as (parts of) dictionary keys and compared throughout the
+        conversion; interned strings make those hashes and comparisons cheap.
+
+        Args:
+            root_doc: List of parsed statements, including nested docs
+        """
+        pending = [root_doc]
+        while pending:
+            node = pending.pop()
+            if isinstance(node, list):
+                pending.extend(node)
+            elif isinstance(node, dict):
+                for field in self._INTERNED_FIELDS:
+                    value = node.get(field)
+                    if isinstance(value, str):
+                        node[field] = sys.intern(value)
+                pending.extend(
+                    value for value in node.values() if isinstance(value, (list, dict))
+                )
+
+    def _put_state(
+        self,
+        all_states: dict[tuple[str, ...], State],
+        key: tuple[str, ...],
+        state: State,
+    ) -> None:
+        """
+        Store a state under the given key, keeping the id_ index in sync.
+
+        Args:
+            all_states: Dictionary of all states
+            key: The (scoped or unscoped) key to store the state under
+            state: The state to store
+        """
+        self._find_cache.clear()
+        previous = all_states.get(key)
+        all_states[key] = state
+        if previous is not None:
+            if previous.id_ == state.id_:
+                # Same id_: the key keeps its position, so does its index entry
+                return
+            self._id_index[previous.id_].remove(key)
+        self._id_index[state.id_].append(key)
+
+    def _del_state(
+        self, all_states: dict[tuple[str, ...], State], key: tuple[str, ...]
+    ) -> None:
         """
-        if parent_id and not ("_start" in state_id or "_end" in state_id):
-            return f"{parent_id}_{state_id}"
-        return state_id
+        Remove the state stored under the given key, keeping the id_ index in sync.
 
-    def _find_nearest_common_ancestor(self, path1: str, path2: str) -> str:
+        Args:
+            all_states: Dictionary of all states
+            key: The key to remove
+        """
+        self._find_cache.clear()
+        state = all_states.pop(key)
+        self._id_index[state.id_].remove(key)
+
+    def _relocate(
+        self,
+        all_states: dict[tuple[str, ...], State],
+        state: State,
+        old_key: tuple[str, ...],
+        new_key: tuple[str, ...],
+        parent_id: str = None,
+    ) -> None:
+        """
+        Move a state from one scope to another, keeping parent_id and the id_ index in sync.
+
+        Args:
+            all_states: Dictionary of all states
+            state: The state to move
+            old_key: The key the state is currently stored under
+            new_key: The key of the scope the state moves to
+            parent_id: ID of the state's new parent (None for root level)
+        """
+        state.parent_id = parent_id
+        if new_key == old_key:
+            return
+        if old_key in all_states:
+            self._del_state(all_states, old_key)
+        self._put_state(all_states, new_key, state)
+
+    def _find_nearest_common_ancestor(
+        self, path1: tuple[str, ...], path2: tuple[str, ...]
+    ) -> tuple[str, ...]:
         """
         Find the nearest common ancestor of two paths.
 
         Args:
-            path1: First hierarchical path (e.g., "On_LoggedOut")
-            path2: Second hierarchical path (e.g., "On_LoggedIn_Print")
+            path1: First hierarchical path (e.g., ("On", "LoggedOut"))
+            path2: Second hierarchical path (e.g., ("On", "LoggedIn", "Print"))
 
         Returns:
-            The nearest common ancestor path (e.g., "On"), or None if no common ancestor
+            The nearest common ancestor path (e.g., ("On",)), or None if no common ancestor
         """
         if not path1 or not path2:
             return None
 
-        parts1 = path1.split("_")
-        parts2 = path2.split("_")
-
-        common = []
-        for p1, p2 in zip(parts1, parts2):
-            if p1 == p2:
-                common.append(p1)
-            else:
-                break
+        # Length of the shared prefix; the ancestor is a slice of path1
+        depth = 0
+        max_depth = min(len(path1), len(path2))
+        while depth < max_depth and path1[depth] == path2[depth]:
+            depth += 1
 
-        return "_".join(common) if common else None
+        return path1[:depth] if depth else None
 
     def _find_state_in_all_states(
         self,
         state_id: str,
-        parent_path: str,
-        all_states: dict[str, State],
+        parent_path: tuple[str, ...],
+        all_states: dict[tuple[str, ...], State],
         allow_sibling_search: bool = True,
-    ) -> tuple[State, str]:
+    ) -> tuple[State, tuple[str, ...]]:
         """
         Find a state in all_states, checking both scoped and unscoped keys.
         Priority:
@@ -567,24 +832,48 @@ class StateDiagramConverter:
         Returns:
             Tuple of (state, key_used) or (None, None) if not found
         """
+        # Endpoints are looked up repeatedly (e.g. chains of transitions); the answer
+        # only changes when all_states does, which clears the cache
+        cache_key = (state_id, parent_path, allow_sibling_search)
+        found = self._find_cache.get(cache_key)
+        if found is None:
+            found = self._search_all_states(
+                state_id, parent_path, all_states, allow_sibling_search
+            )
+            self._find_cache[cache_key] = found
+        return found
+
+    def _search_all_states(
+        self,
+        state_id: str,
+        parent_path: tuple[str, ...],
+        all_states: dict[tuple[str, ...], State],
+        allow_sibling_search: bool,
+    ) -> tuple[State, tuple[str, ...]]:
+        """
+        Uncached lookup behind _find_state_in_all_states (same arguments and result).
+        """
         # First check if it exists in the current scope with a scoped key
         scoped_key = self._get_scoped_key(state_id, parent_path)
-        if scoped_key in all_states:
-            return all_states[scoped_key], scoped_key
+        state = all_states.get(scoped_key)
+        if state is not None:
+            return state, scoped_key
 
         # Then check if it exists at unscoped (global/root) level
-        # This handles references to root-level states from any scope
-        if state_id in all_states:
-            return all_states[state_id], state_id
+        # This handles references to root-level states from any scope.
+        # At root level (or for Start/End) the scoped key already is the root key.
+        if len(scoped_key) > 1:
+            root_key = (state_id,)
+            state = all_states.get(root_key)
+            if state is not None:
+                return state, root_key
 
         # Check parent scopes by walking up the hierarchy
-        # e.g., if we're in On_LoggedIn_Print and looking for Idle,
-        # check if On_LoggedIn_Idle exists
-        if parent_path and "_" in parent_path:
-            parts = parent_path.split("_")
-            for i in range(len(parts), 0, -1):
-                parent_prefix = "_".join(parts[:i])
-                parent_scoped_key = f"{parent_prefix}_{state_id}"
+        # e.g., if we're in ('On', 'LoggedIn', 'Print') and looking for Idle,
+        # check if ('On', 'LoggedIn', 'Idle') exists
+        if parent_path and len(parent_path) > 1:
+            for i in range(len(parent_path), 0, -1):
+                parent_scoped_key = parent_path[:i] + (state_id,)
                 if parent_scoped_key in all_states:
                     return all_states[parent_scoped_key], parent_scoped_key
 
@@ -593,51 +882,52 @@ class StateDiagramConverter:
         # IMPORTANT: Don't return states from sibling composite states (e.g., Print's Suspended
         # when looking from Scan). Each composite state should have its own local states.
         if allow_sibling_search and parent_path:
-            for key, state in all_states.items():
-                # Check if this state has matching id_
-                if hasattr(state, "id_") and state.id_ == state_id:
-                    # Check if this state is in an ancestor scope of the current path
-                    # (not a sibling composite state at the same level)
-                    # For example, if parent_path is "On_LoggedIn_Scan" and key is "On_LoggedIn_Print_Suspended",
-                    # this is NOT an ancestor (it's a sibling), so skip it.
-                    # But if key is "On_LoggedIn_Error", it IS in an ancestor scope.
-                    state_scope = key.rsplit("_", 1)[0] if "_" in key else ""
-                    # State is in ancestor scope if the current path starts with the state's scope
-                    # or if the state is at the same level as an ancestor
-                    if state_scope and parent_path.startswith(state_scope + "_"):
-                        # This state's scope is a prefix of our current path - it's an ancestor
-                        return state, key
-                    elif not state_scope:
-                        # Root level state
-                        return state, key
+            # Only keys whose state has a matching id_ are candidates
+            for key in self._id_index.get(state_id, ()):
+                state = all_states[key]
+                # Check if this state is in an ancestor scope of the current path
+                # (not a sibling composite state at the same level)
+                # For example, if parent_path is ('On', 'LoggedIn', 'Scan') and key is
+                # ('On', 'LoggedIn', 'Print', 'Suspended'), this is NOT an ancestor (it's a
+                # sibling), so skip it. But if key is ('On', 'LoggedIn', 'Error'), it IS in
+                # an ancestor scope.
+                state_scope = key[:-1]
+                # State is in ancestor scope if the current path starts with the state's scope
+                # or if the state is at the same level as an ancestor
+                if (
+                    state_scope
+                    and len(parent_path) > len(state_scope)
+                    and parent_path[: len(state_scope)] == state_scope
+                ):
+                    # This state's scope is a prefix of our current path - it's an ancestor
+                    return state, key
+                elif not state_scope:
+                    # Root level state
+                    return state, key
 
         # If we're at root level (parent_path is None), search all scopes for this state
         # This handles cases where a state is defined in a nested scope but referenced from root
         if parent_path is None:
-            for key, state in all_states.items():
-                # Check if this key ends with the state_id and the state's id_ matches
-                if (
-                    (key.endswith(f"_{state_id}") or key == state_id)
-                    and hasattr(state, "id_")
-                    and state.id_ == state_id
-                ):
-                    return state, key
+            for key in self._id_index.get(state_id, ()):
+                # Check if this key ends with the state_id (the index guarantees id_ matches)
+                if key[-1] == state_id:
+                    return all_states[key], key
 
         return None, None
 
     def _convert_transitions(
         self,
-        root_doc: list[dict],
+        relation_items: list[dict],
         current_states: dict[str, State],
-        all_states: dict[str, State],
+        all_states: dict[tuple[str, ...], State],
         parent_id: str = None,
-        parent_path: str = None,
+        parent_path: tuple[str, ...] = None,
     ) -> list[Transition]:
         """
         Convert relation items to Transition objects.
 
         Args:
-            root_doc: List of parsed state diagram elements
+            relation_items: List of parsed relation elements at this level
             current_states: Dictionary of current states on the current level
             all_states: Dictionary to store all states by id in the state diagram
             parent_id: ID of the parent state (for transitions within a composite state)
@@ -647,251 +937,220 @@ class StateDiagramConverter:
             List of Transition objects
         """
         # If parent_path is not provided, use parent_id
-        if parent_path is None:
-            parent_path = parent_id
+        if parent_path is None and parent_id is not None:
+            parent_path = (parent_id,)
         transitions = []
+        # Bound once: these run for both endpoints of every relation
+        find_state = self._find_state_in_all_states
+        create_in_scope = self._create_in_scope
 
         # Process relation items
-        for item in root_doc:
-            # Skip items that are strings
-            if isinstance(item, str):
-                continue
-
-            if item["stmt"] == "relation":
-                state1_info = item["state1"]
-                state2_info = item["state2"]
+        for item in relation_items:
+            state1_info = item["state1"]
+            state2_info = item["state2"]
+
+            # Handle state1
+            from_id = state1_info["id"]
+            from_state, found_key = find_state(from_id, parent_path, all_states)
+
+            # If we're at root level and found a state in a nested scope that's the SOURCE of this transition
+            # then promote it to root level (it's directly accessible from root)
+            if from_state and parent_id is None and found_key and len(found_key) > 1:
+                # Check if a root-level version already exists
+                if (from_id,) not in all_states:
+                    # This state is the source of a root-level transition
+                    # Promote it to root level, under its unscoped key
+                    self._relocate(all_states, from_state, found_key, (from_id,))
+                else:
+                    # Root version exists, use that instead
+                    from_state = all_states[(from_id,)]
 
-                # Handle state1
-                from_id = state1_info["id"]
-                from_state, found_key = self._find_state_in_all_states(
-                    from_id, parent_path, all_states
+            if from_state is None:
+                # This state is being defined for the first time
+                from_state = create_in_scope(
+                    state1_info, parent_id, parent_path, current_states, all_states
                 )
 
-                # If we're at root level and found a state in a nested scope that's the SOURCE of this transition
-                # then promote it to root level (it's directly accessible from root)
-                if from_state and parent_id is None and found_key and "_" in found_key:
-                    # Check if a root-level version already exists
-                    if from_id not in all_states:
-                        # This state is the source of a root-level transition
-                        # Promote it to root level
-                        from_state.parent_id = None
-                        # Also store it with unscoped key for future lookups
-                        all_states[from_id] = from_state
-                        # Remove the scoped key to avoid duplication
-                        if found_key in all_states:
-                            del all_states[found_key]
-                    else:
-                        # Root version exists, use that instead
-                        from_state = all_states[from_id]
-
-                if from_state is None:
-                    # This state is being defined for the first time
-                    if parent_id and from_id == parent_id:
-                        # Self-reference: Don't set parent_id, use unscoped key
-                        new_state = self._create_state(
-                            state1_info, parent_id=None, scoped_id=from_id
-                        )
-                        all_states[from_id] = new_state
-                        from_state = new_state
-                    elif "_start" in from_id or "_end" in from_id:
-                        # Start/End states: use scoped key
-                        scoped_key = self._get_scoped_key(from_id, parent_path)
-                        new_state = self._create_state(
-                            state1_info, parent_id, scoped_id=scoped_key
-                        )
-                        all_states[scoped_key] = new_state
-                        from_state = new_state
-                    elif parent_id:
-                        # New state in this scope: use scoped key
-                        scoped_key = self._get_scoped_key(from_id, parent_path)
-                        new_state = self._create_state(
-                            state1_info, parent_id, scoped_id=scoped_key
-                        )
-                        all_states[scoped_key] = new_state
-                        from_state = new_state
-                    else:
-                        # Root level state: use unscoped key
-                        new_state = self._create_state(
-                            state1_info, parent_id=None, scoped_id=from_id
-                        )
-                        all_states[from_id] = new_state
-                        from_state = new_state
-
-                    # Always add the new state to current_states
-                    current_states[from_id] = from_state
-
-                # Handle state2
-                to_id = state2_info["id"]
-                # If this transition starts from a start marker ([*] or _start),
-                # the destination should be created in the current scope, not found in siblings
-                is_initial_transition = (
-                    from_id == "[*]" or "_start" in from_id or from_id == "root_start"
-                )
-                to_state, found_key = self._find_state_in_all_states(
-                    to_id,
-                    parent_path,
-                    all_states,
-                    allow_sibling_search=not is_initial_transition,
-                )
+            # Handle state2
+            to_id = state2_info["id"]
+            # If this transition starts from a start marker ([*] or _start),
+            # the destination should be created in the current scope, not found in siblings
+            is_initial_transition = self._is_initial_marker(from_id)
+            to_state, found_key = find_state(
+                to_id,
+                parent_path,
+                all_states,
+                allow_sibling_search=not is_initial_transition,
+            )
 
-                # If we found the state in a different scope, promote it to nearest common ancestor
-                if to_state and found_key and parent_path:
-                    # Get the current parent of the found state
-                    current_parent = getattr(to_state, "parent_id", None)
-                    # Calculate paths for comparison
-                    current_state_path = (
-                        found_key.rsplit("_", 1)[0] if "_" in found_key else None
-                    )
+            # If we found the state in a different scope, promote it to nearest common ancestor
+            if to_state and found_key and parent_path:
+                # The found state's current scope is its key without the id
+                current_state_path = found_key[:-1] or None
 
-                    # If the state is in a different branch of the hierarchy
-                    if current_state_path and current_state_path != parent_path:
-                        # Find nearest common ancestor
-                        common_ancestor = self._find_nearest_common_ancestor(
-                            current_state_path, parent_path
-                        )
+                # If the state is in a different branch of the hierarchy
+                if current_state_path and current_state_path != parent_path:
+                    # Find nearest common ancestor
+                    common_ancestor = self._find_nearest_common_ancestor(
+                        current_state_path, parent_path
+                    )
 
-                        if common_ancestor:
-                            # Promote the state to the common ancestor
-                            # Extract the parent_id from the common ancestor path
-                            new_parent_id = (
-                                common_ancestor.split("_")[-1]
-                                if common_ancestor
-                                else None
-                            )
-                            to_state.parent_id = new_parent_id
-
-                            # Update the key in all_states
-                            new_key = self._get_scoped_key(to_id, common_ancestor)
-                            if new_key != found_key:
-                                # Remove old key, add new key
-                                if found_key in all_states:
-                                    del all_states[found_key]
-                                all_states[new_key] = to_state
-
-                if to_state is None:
-                    # This state is being defined for the first time
-                    if parent_id and to_id == parent_id:
-                        # Self-reference: Don't set parent_id, use unscoped key
-                        new_state = self._create_state(
-                            state2_info, parent_id=None, scoped_id=to_id
-                        )
-                        all_states[to_id] = new_state
-                        to_state = new_state
-                    elif "_start" in to_id or "_end" in to_id:
-                        # Start/End states: use scoped key
-                        scoped_key = self._get_scoped_key(to_id, parent_path)
-                        new_state = self._create_state(
-                            state2_info, parent_id, scoped_id=scoped_key
-                        )
-                        all_states[scoped_key] = new_state
-                        to_state = new_state
-                    elif parent_id:
-                        # New state in this scope: use scoped key
-                        scoped_key = self._get_scoped_key(to_id, parent_path)
-                        new_state = self._create_state(
-                            state2_info, parent_id, scoped_id=scoped_key
-                        )
-                        all_states[scoped_key] = new_state
-                        to_state = new_state
-                    else:
-                        # Root level state: use unscoped key
-                        new_state = self._create_state(
-                            state2_info, parent_id=None, scoped_id=to_id
+                    if common_ancestor:
+                        # Promote the state to the common ancestor
+                        new_key = self._get_scoped_key(to_id, common_ancestor)
+                        self._relocate(
+                            all_states,
+                            to_state,
+                            found_key,
+                            new_key,
+                            parent_id=common_ancestor[-1],
                         )
-                        all_states[to_id] = new_state
-                        to_state = new_state
 
-                    # Always add the new state to current_states
-                    current_states[to_id] = to_state
+            if to_state is None:
+                # This state is being defined for the first time
+                to_state = create_in_scope(
+                    state2_info, parent_id, parent_path, current_states, all_states
+                )
 
-                # Get transition label if present
-                label = item.get("description", "")
+            # Get transition label if present
+            label = item.get("description", "")
 
-                transition = Transition(from_=from_state, to=to_state, label=label)
-                transitions.append(transition)
+            transition = Transition(from_=from_state, to=to_state, label=label)
+            transitions.append(transition)
 
         return transitions
 
-    def _process_parallel_regions(
+    def _index_transitions(self, transitions: list[Transition], offset: int) -> None:
+        """
+        Record transitions in the by-source index used for history processing.
+
+        Args:
+            transitions: Transitions about to be appended to the diagram's list
+            offset: Position of the first of them in that list
+        """
+        by_from = self._transitions_by_from
+        for position, transition in enumerate(transitions, offset):
+            # Lowercased once here rather than once per history note
+            is_resume = "resume" in (transition.label or "").lower()
+            by_from.setdefault(transition.from_state.id_, []).append(
+                (position, is_resume, transition)
+            )
+            if isinstance(transition.from_state, Start):
+                self._start_positions.append(position)
+
+    def _create_in_scope(
         self,
-        divider_regions: list[dict],
-        all_states: dict[str, State],
-        parent_id: str = None,
-        parent_path: str = None,
-    ) -> list[dict]:
+        state_info: dict,
+        parent_id: str,
+        parent_path: tuple[str, ...],
+        current_states: dict[str, State],
+        all_states: dict[tuple[str, ...], State],
+    ) -> State:
         """
-        Process divider regions to extract parallel state information.
+        Create a state first referenced by a transition and register it in the current scope.
+
+        Args:
+            state_info: Parsed state element of the relation
+            parent_id: ID of the parent state (None at root level)
+            parent_path: Full hierarchical path to parent - used for scoped keys
+            current_states: Dictionary of current states on the current level
+            all_states: Dictionary of all states
+
+        Returns:
+            The newly created state
+        """
+        state_id = state_info["id"]
+        if parent_id and state_id == parent_id:
+            # Self-reference: Don't set parent_id, use unscoped key
+            parent_id, key = None, (state_id,)
+        else:
+            # Scoped key in a composite; Start/End and root states stay unscoped
+            key = self._get_scoped_key(state_id, parent_path)
+
+        state = self._create_state(state_info, parent_id, scoped_id=key)
+        self._put_state(all_states, key, state)
+        # Always add the new state to current_states
+        current_states[state_id] = state
+        return state
+
+    def _build_region_info(self, frame: _LevelFrame) -> dict:
+        """
+        Build the parallel state information of a processed divider region.
 
         Each divider region contains states and transitions that should run
         concurrently with other regions under the same parent.
 
         Args:
-            divider_regions: List of divider items from the parser
-            all_states: Dictionary to store all states by id
-            parent_id: ID of the parent composite state
-            parent_path: Full hierarchical path to parent
+            frame: The finished frame of the region
 
         Returns:
-            List of region dictionaries, each containing:
+            Region dictionary containing:
             - 'name': Region identifier (e.g., 'region_0', 'region_1')
             - 'states': Dict of states in this region
             - 'transitions': List of transitions in this region
             - 'initial': Initial state ID for this region (if any)
         """
-        parallel_info = []
-
-        for idx, divider in enumerate(divider_regions):
-            divider_id = divider.get("id", f"region_{idx}")
-            divider_doc = divider.get("doc", [])
-
-            # Create a unique region name
-            region_name = f"region_{idx}"
-
-            # Process the divider's content using the existing conversion logic
-            # Use a modified parent path that includes the region identifier
-            region_parent_path = (
-                f"{parent_path}_{region_name}" if parent_path else region_name
-            )
+        idx, divider = frame.region
+        # The region name is the last component of the region's parent path
+        region_name = frame.parent_path[-1]
+        divider_id = divider.get("id", region_name)
+
+        # The region's subtree is everything produced since it was opened
+        first_level, first_note, first_transition = frame.start
+        states = {}
+        for level_states in frame.levels[first_level:]:
+            states.update(level_states)
+        transitions = frame.transitions[first_transition:]
+
+        # Find the initial state for this region: the target of its first transition
+        # leaving a start state, looked up in the index instead of scanning
+        initial_state = None
+        if any(isinstance(state, Start) for state in states.values()):
+            start_positions = self._start_positions
+            i = bisect.bisect_left(start_positions, first_transition)
+            if i < len(start_positions):
+                initial_state = frame.transitions[start_positions[i]].to_state.id_
+
+        return {
+            "name": region_name,
+            "divider_id": divider_id,  # Original divider ID for reference
+            "states": states,
+            "transitions": transitions,
+            "notes": frame.notes[first_note:],
+            "initial": initial_state,
+        }
+
+    def _attach_parallel_regions(
+        self, frame: _LevelFrame, all_states: dict[tuple[str, ...], State]
+    ) -> None:
+        """
+        Mark the parent state of a level as having parallel regions.
 
-            region_states, region_notes, region_transitions = (
-                self._convert_states_and_notes(
-                    divider_doc,
-                    all_states,
-                    parent_id=parent_id,  # States belong to the same parent
-                    parent_path=region_parent_path,
+        Args:
+            frame: The finished frame whose divider regions were processed
+            all_states: Dictionary of all states
+        """
+        parent_id = frame.parent_id
+        parallel_info = frame.parallel_info
+        # The parent state is in all_states, not the local states dict
+        if parent_id:
+            # Find the parent state in all_states (try both scoped and unscoped keys)
+            parent_state = all_states.get((parent_id,))
+            if parent_state is None:
+                # Scoped parent: take the first key holding a state with this id_
+                keys = self._id_index.get(parent_id)
+                if keys:
+                    parent_state = all_states[keys[0]]
+
+            if parent_state:
+                # Add parallel_regions attribute dynamically
+                parent_state.parallel_regions = parallel_info
+                logger.debug(
+                    f"Set parallel_regions on {parent_id}: {len(parallel_info)} regions"
                 )
-            )
-
-            # Find the initial state for this region
-            initial_state = None
-            for state_id, state in region_states.items():
-                if isinstance(state, Start):
-                    # Find what the start state transitions to
-                    for trans in region_transitions:
-                        if isinstance(trans.from_state, Start):
-                            initial_state = (
-                                trans.to_state.id_
-                                if hasattr(trans.to_state, "id_")
-                                else str(trans.to_state)
-                            )
-                            break
-                    break
-
-            parallel_info.append(
-                {
-                    "name": region_name,
-                    "divider_id": divider_id,  # Original divider ID for reference
-                    "states": region_states,
-                    "transitions": region_transitions,
-                    "notes": region_notes,
-                    "initial": initial_state,
-                }
-            )
-
-        return parallel_info
 
     def _convert_state_diagram(
-        self, root_doc: list[dict], all_states: dict[str, State]
+        self, root_doc: list[dict], all_states: dict[tuple[str, ...], State]
     ) -> tuple[list[State], list[Transition], list[Note]]:
         """
         Convert parsed state diagram data to StateDiagramWithNote object.
@@ -903,10 +1162,12 @@ class StateDiagramConverter:
         Returns:
             Tuple of (state_list, transitions, notes)
         """
+        # Nothing to convert (e.g. a bare "stateDiagram-v2" header)
+        if not root_doc:
+            return [], [], []
+
         # Convert states, notes, and transitions (recursively processes composite states)
-        states_dict, notes, transitions = self._convert_states_and_notes(
-            root_doc, all_states
-        )
+        notes, transitions = self._convert_states_and_notes(root_doc, all_states)
 
         # Create the state diagram from all_states (which includes both scoped and unscoped states)
         state_list = list(all_states.values())
@@ -915,10 +1176,24 @@ class StateDiagramConverter:
 
     # def to_networkx(self, state_diagram: StateDiagram) -> nx.DiGraph:
     #     G = nx.DiGraph()
-    #     for node in state_diagram.nodes.values():
-    #         G.add_node(node.id, content=node.content, shape=node.shape)
-    #     for link in state_diagram.links:
-    #         G.add_edge(
-    #             link.origin.id, link.end.id, shape=link.shape, message=link.message
-    #         )
+    #     G.add_nodes_from(
+    #         (state.id_, {"content": state.content}) for state in state_diagram.states
+    #     )
+    #     G.add_edges_from(
+    #         (t.from_state.id_, t.to_state.id_, {"label": t.label})
+    #         for t in state_diagram.transitions
+    #     )
     #     return G
+
+
+# Converter of the current worker process, see StateDiagramConverter.convert_many
+_worker_converter: StateDiagramConverter = None
+
+
+def _init_worker() -> None:
+    global _worker_converter
+    _worker_converter = StateDiagramConverter()
+
+
+def _convert_in_worker(mermaid_text: str) -> StateDiagramWithNote:
+    return _worker_converter.convert(mermaid_text)
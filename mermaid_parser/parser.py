@@ -3,21 +3,29 @@ import pythonmonkey as pm
 from pydantic import BaseModel
 
 import asyncio
+from functools import lru_cache
 from pathlib import Path
 
 folder = Path(__file__).parent
 parse_mermaid_js = pm.require(f"{folder}/js/parser.bundle.js")
 
 
-async def parse_mermaid_py(src: str):
-    # Use top-level await inside this eval call
-    s = await parse_mermaid_js(src)
-    return json.loads(s)
+async def parse_mermaid_py(src: str) -> str:
+    # The JS call must be awaited inside a running event loop; returns raw JSON text
+    return await parse_mermaid_js(src)
+
+
+@lru_cache(maxsize=256)
+def _parse_to_json(src: str) -> str:
+    # Running the JS parser dominates parse time, so keep its raw JSON output
+    # for recently seen sources (shared by all parser instances)
+    return asyncio.run(parse_mermaid_py(src))
 
 
 class MermaidParser(BaseModel):
     def parse(self, mermaid_text: str) -> dict:
-        return asyncio.run(parse_mermaid_py(mermaid_text))
+        # Decode on every call so callers can modify the result freely
+        return json.loads(_parse_to_json(mermaid_text))
 
 
 if __name__ == "__main__":
@@ -29,6 +29,9 @@ class HistoryState(State):
 
 
 class Note:
+    # Notes only ever carry these three fields; slots drop the per-instance __dict__
+    __slots__ = ("content", "target_state", "position")
+
     def __init__(self, content: str, target_state: State, position: str) -> None:
         self.content: str = content
         self.target_state: State = target_state
@@ -56,6 +59,8 @@ class StateDiagramWithNote(StateDiagram):
         config: Optional[Config] = None,
         root_initial_state: Optional[str] = None,
         initial_states: Optional[dict] = None,
+        states_by_id: Optional[dict] = None,
+        children_by_parent: Optional[dict] = None,
     ) -> None:
         """StateDiagramWithNote
 
@@ -69,30 +74,32 @@ class StateDiagramWithNote(StateDiagram):
             config (Optional[Config], optional): Configuration for the stateDiagram. Defaults to None.
             root_initial_state (Optional[str], optional): The root-level initial state ID. Defaults to None.
             initial_states (Optional[dict], optional): Map of composite state ID -> initial child state ID. Defaults to None.
+            states_by_id (Optional[dict], optional): Map of state ID -> states with that ID (several when scopes or parallel regions reuse it), start/end markers excluded. Defaults to None.
+            children_by_parent (Optional[dict], optional): Map of parent state ID (None for the root) -> child states. Defaults to None.
         """  # noqa E501
         self.notes = notes
         self.root_initial_state = root_initial_state
         self.initial_states = initial_states if initial_states is not None else {}
+        self.states_by_id = states_by_id if states_by_id is not None else {}
+        self.children_by_parent = (
+            children_by_parent if children_by_parent is not None else {}
+        )
         super().__init__(title, states, transitions, version, direction, config)
 
     def _build_script(self) -> None:
-        script: str = f"---\ntitle: {self.title}\n---"
+        # Collect the lines and join once instead of growing a string per element
+        lines: list[str] = [f"---\ntitle: {self.title}\n---"]
         if self.config:
-            script += "\n" + str(self.config)
+            lines.append(str(self.config))
         str_version: str = f"-{self.version}" if self.version != "v1" else ""
-        script += f"\nstateDiagram{str_version}"
+        lines.append(f"stateDiagram{str_version}")
         if self.direction:
-            script += f"\n\tdirection {self.direction}"
-        for style in self.styles:
-            script += f"\n\t{style}"
-        for state in self.states:
-            if isinstance(state, Start) or isinstance(state, End):
-                continue
-            script += f"\n\t{state}"
-        for transition in self.transitions:
-            script += f"\n\t{transition}"
-        for note in self.notes:
-            note_str = str(note).replace("\n", "\n\t")
-            script += f"\n\t{note_str}"
+            lines.append(f"\tdirection {self.direction}")
+        lines.extend(f"\t{style}" for style in self.styles)
+        lines.extend(
+            f"\t{state}" for state in self.states if not isinstance(state, (Start, End))
+        )
+        lines.extend(f"\t{transition}" for transition in self.transitions)
+        lines.extend("\t" + str(note).replace("\n", "\n\t") for note in self.notes)
 
-        self.script += script + "\n"
+        self.script += "\n".join(lines) + "\n"
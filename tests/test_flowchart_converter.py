@@ -81,3 +81,15 @@ class TestFlowChartConverter:
         assert link.head_left == head_left
         assert link.head_right == lead_right
         assert link.shape == link_type
+
+    def test_to_networkx(self):
+        converter = FlowChartConverter()
+        result = converter.convert("flowchart TD\nA[Start] --> B[End]\nB --> C")
+
+        G = converter.to_networkx(result)
+
+        assert set(G.nodes) == {"a", "b", "c"}
+        assert list(G.edges) == [("a", "b"), ("b", "c")]
+        assert G.nodes["a"]["content"] == "Start"
+        assert G.nodes["a"]["shape"] == NODE_SHAPES["normal"]
+        assert G.edges["a", "b"]["shape"] == LINK_SHAPES["normal"]
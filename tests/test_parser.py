@@ -0,0 +1,15 @@
+from mermaid_parser import MermaidParser
+
+
+class TestMermaidParser:
+    def test_repeated_parse_returns_equal_independent_results(self):
+        """Test that a cached parse still hands out a fresh dict on every call"""
+        mermaid_text = "stateDiagram-v2\n    [*] --> Idle\n    Idle --> Running : start"
+
+        first = MermaidParser().parse(mermaid_text)
+        second = MermaidParser().parse(mermaid_text)
+
+        assert first == second
+        assert first is not second
+        assert first["graph_data"] is not second["graph_data"]
+        assert first["graph_type"] == "stateDiagram"
@@ -2,15 +2,7 @@ import pytest
 from mermaid_parser.converters.state_diagram import StateDiagramConverter
 from mermaid_parser.structs.state_diagram import StateDiagramWithNote
 
-
-class TestStateDiagramConverter:
-    @pytest.fixture
-    def converter(self):
-        return StateDiagramConverter()
-
-    def test_convert_state_diagram_with_notes(self, converter):
-        """Test convert function with state diagram containing multiple notes"""
-        mermaid_text = """
+_MERMAID_WITH_NOTES = """
 stateDiagram-v2
     State1: The state with a note
     [*] --> State1
@@ -23,68 +15,9 @@ stateDiagram-v2
     State1 --> State2
     note left of State2 : This is the note to the left.
     State2 --> [*]
-        """
-
-        result = converter.convert(mermaid_text)
-
-        # Verify the result is a StateDiagramWithNote
-        assert isinstance(result, StateDiagramWithNote)
-        assert result.title == "State Diagram"
-        assert result.version == "v2"
-
-        # Verify states exist
-        assert len(result.states) > 0
-        state_ids = [getattr(state, "id_", None) for state in result.states]
-        state_ids = [id_ for id_ in state_ids if id_ is not None]
-
-        assert len(state_ids) == 4  # start, State1, State2, end
-
-        # Check that our main states are present
-        assert "State1" in state_ids
-        assert "State2" in state_ids
-
-        # Verify State1 has the correct description
-        state1 = next(
-            (
-                state
-                for state in result.states
-                if getattr(state, "id_", None) == "State1"
-            ),
-            None,
-        )
-        assert state1 is not None
-        assert state1.content == "The state with a note"
-
-        # Verify transitions exist
-        assert (
-            len(result.transitions) >= 3
-        )  # [*] -> State1, State1 -> State2, State2 -> [*]
-
-        # Verify notes exist
-        assert len(result.notes) == 3
-
-        # Check note contents
-        note_contents = [note.content for note in result.notes]
-        assert "note1" in note_contents
-        assert "note2" in note_contents
-        assert "This is the note to the left." in note_contents
-
-        # Verify note positions and targets
-        state1_notes = [
-            note for note in result.notes if note.target_state.id_ == "State1"
-        ]
-        state2_notes = [
-            note for note in result.notes if note.target_state.id_ == "State2"
-        ]
-
-        assert len(state1_notes) == 2
-        assert len(state2_notes) == 1
+""".strip()
 
-        # Check positions
-        assert all([note.position == "right of" for note in state1_notes])
-        assert state2_notes[0].position == "left of"
-
-        expected_script = """---
+_EXPECTED_NOTES_SCRIPT = """---
 title: State Diagram
 ---
 stateDiagram-v2
@@ -102,14 +35,8 @@ stateDiagram-v2
     note left of State2
         This is the note to the left.
     end note"""
-        actual_script = result.script.strip()
-        # replace tabs with spaces for comparision
-        actual_script = actual_script.replace("\t", "    ")
-        assert actual_script == expected_script.strip()
-
-    def test_parent_id_with_composite_states(self, converter):
-        """Test that parentId is correctly set for composite states and not for references"""
-        mermaid_text = """
+
+_MERMAID_COMPOSITE = """
 stateDiagram-v2
     [*] --> Off
     Off --> On : on
@@ -119,51 +46,9 @@ stateDiagram-v2
         On --> Off : off
         Idle --> Ready : login
     }
-        """
+""".strip()
 
-        result = converter.convert(mermaid_text)
-
-        # Helper to find state by id
-        def find_state(state_id):
-            return next(
-                (s for s in result.states if getattr(s, "id_", None) == state_id),
-                None,
-            )
-
-        # Test 1: Off should NOT have parentId="On" (it's defined at root, just referenced in transition)
-        off_state = find_state("Off")
-        assert off_state is not None, "Off state should exist"
-        off_parent = getattr(off_state, "parent_id", None)
-        assert (
-            off_parent is None
-        ), f"Off should have parent_id=None, but got parent_id={off_parent}"
-
-        # Test 2: On should NOT have parentId="On" (no self-reference)
-        on_state = find_state("On")
-        assert on_state is not None, "On state should exist"
-        on_parent = getattr(on_state, "parent_id", None)
-        assert (
-            on_parent is None
-        ), f"On should have parent_id=None, but got parent_id={on_parent}"
-
-        # Test 3: Idle and Ready should have parentId="On" (defined within On's block)
-        idle_state = find_state("Idle")
-        assert idle_state is not None, "Idle state should exist"
-        idle_parent = getattr(idle_state, "parent_id", None)
-        assert (
-            idle_parent == "On"
-        ), f"Idle should have parent_id='On', but got parent_id={idle_parent}"
-
-        ready_state = find_state("Ready")
-        assert ready_state is not None, "Ready state should exist"
-        ready_parent = getattr(ready_state, "parent_id", None)
-        assert (
-            ready_parent == "On"
-        ), f"Ready should have parent_id='On', but got parent_id={ready_parent}"
-
-    def test_parent_id_with_nested_composite_states(self, converter):
-        """Test parentId with multiple levels of nesting"""
-        mermaid_text = """
+_MERMAID_NESTED_COMPOSITE = """
 stateDiagram-v2
     state On {
         state LoggedIn {
@@ -173,43 +58,9 @@ stateDiagram-v2
         }
     }
     Error --> LoggedOut : ack
-        """
+""".strip()
 
-        result = converter.convert(mermaid_text)
-
-        def find_state(state_id):
-            return next(
-                (s for s in result.states if getattr(s, "id_", None) == state_id),
-                None,
-            )
-
-        # LoggedIn should have parent_id="On"
-        logged_in = find_state("LoggedIn")
-        if logged_in:  # May not exist if composite not implemented yet
-            assert getattr(logged_in, "parent_id", None) == "On"
-
-        # Print should have parent_id="LoggedIn"
-        print_state = find_state("Print")
-        if print_state:
-            assert getattr(print_state, "parent_id", None) == "LoggedIn"
-
-        # Printing should have parent_id="Print"
-        printing = find_state("Printing")
-        if printing:
-            assert getattr(printing, "parent_id", None) == "Print"
-
-        # Error and LoggedOut should have parent_id=None (root level)
-        error = find_state("Error")
-        if error:
-            assert getattr(error, "parent_id", None) is None
-
-        logged_out = find_state("LoggedOut")
-        if logged_out:
-            assert getattr(logged_out, "parent_id", None) is None
-
-    def test_parent_id_sibling_reference(self, converter):
-        """Test that sibling states referenced in transitions don't get incorrect parentId"""
-        mermaid_text = """
+_MERMAID_SIBLING_COMPOSITES = """
 stateDiagram-v2
     state A {
         A --> B : go_to_b
@@ -217,32 +68,9 @@ stateDiagram-v2
     state B {
         B --> A : go_to_a
     }
-        """
-
-        result = converter.convert(mermaid_text)
+""".strip()
 
-        def find_state(state_id):
-            return next(
-                (s for s in result.states if getattr(s, "id_", None) == state_id),
-                None,
-            )
-
-        # Both A and B should have parent_id=None (both are root-level composite states)
-        a_state = find_state("A")
-        if a_state:
-            assert (
-                getattr(a_state, "parent_id", None) is None
-            ), "A should not have parent_id set"
-
-        b_state = find_state("B")
-        if b_state:
-            assert (
-                getattr(b_state, "parent_id", None) is None
-            ), "B should not have parent_id set"
-
-    def test_initial_state_extraction(self, converter):
-        """Test that root_initial_state and initial_states are correctly extracted"""
-        mermaid_text = """
+_MERMAID_INITIAL_STATES = """
 stateDiagram-v2
     [*] --> Off
     Off --> On : powerOn
@@ -257,10 +85,169 @@ stateDiagram-v2
             Idle --> Busy : start
         }
     }
-        """
+""".strip()
+
+_MERMAID_SINGLE_COMPOSITE = """
+stateDiagram-v2
+    [*] --> Idle
+    state Active {
+        [*] --> Working
+        Working --> Paused : pause
+    }
+    Idle --> Active : start
+""".strip()
 
+_MERMAID_REGIONS_SHARED_ID = """
+stateDiagram-v2
+    [*] --> Active
+    state Active {
+        [*] --> Idle
+        Idle --> Typing : key
+        --
+        [*] --> Idle
+        Idle --> Blinking : tick
+    }
+""".strip()
+
+
+def _by_id(states):
+    """Map state ids to states, for lookups without rescanning the state list"""
+    return {s.id_: s for s in states}
+
+
+def _assert_parent(states_by_id, state_id, expected_parent):
+    """Assert that a state exists and has the expected parent_id"""
+    state = states_by_id.get(state_id)
+    assert state is not None, f"{state_id} state should exist"
+    parent = getattr(state, "parent_id", None)
+    assert (
+        parent == expected_parent
+    ), f"{state_id} should have parent_id={expected_parent!r}, but got parent_id={parent!r}"
+
+
+def _norm(script):
+    """Split a script into lines with tabs expanded, so failures diff per line"""
+    return tuple(line.expandtabs(4) for line in script.strip().splitlines())
+
+
+# (diagram, [(state id, expected parent_id)]) for test_parent_id
+PARENT_ID_CASES = [
+    (
+        _MERMAID_COMPOSITE,
+        [
+            # Off is defined at root and only referenced inside On
+            ("Off", None),
+            # No self-reference for the composite itself
+            ("On", None),
+            # Defined within On's block
+            ("Idle", "On"),
+            ("Ready", "On"),
+        ],
+    ),
+    (
+        _MERMAID_NESTED_COMPOSITE,
+        [
+            ("LoggedIn", "On"),
+            ("Print", "LoggedIn"),
+            ("Printing", "Print"),
+            # Only used in a root-level transition
+            ("Error", None),
+            ("LoggedOut", None),
+        ],
+    ),
+    (
+        _MERMAID_SIBLING_COMPOSITES,
+        [
+            # Both are root-level composites referencing each other
+            ("A", None),
+            ("B", None),
+        ],
+    ),
+]
+
+
+class TestStateDiagramConverter:
+    @pytest.fixture(scope="module")
+    def converter(self):
+        return StateDiagramConverter()
+
+    @pytest.fixture(scope="module")
+    def notes_result(self, converter):
+        return converter.convert(_MERMAID_WITH_NOTES)
+
+    def test_convert_state_diagram_with_notes(self, notes_result):
+        """Test convert function with state diagram containing multiple notes"""
+        result = notes_result
+
+        # Verify the result is a StateDiagramWithNote
+        assert isinstance(result, StateDiagramWithNote)
+        assert result.title == "State Diagram"
+        assert result.version == "v2"
+
+        # Verify states exist
+        assert len(result.states) > 0
+        # Every state kind (start/end markers and history states included) has an id_
+        state_ids = [state.id_ for state in result.states]
+
+        assert len(state_ids) == 4  # start, State1, State2, end
+
+        # Check that our main states are present
+        state_id_set = set(state_ids)
+        assert "State1" in state_id_set
+        assert "State2" in state_id_set
+
+        # Verify State1 has the correct description
+        state1 = _by_id(result.states).get("State1")
+        assert state1 is not None
+        assert state1.content == "The state with a note"
+
+        # Verify transitions exist
+        assert (
+            len(result.transitions) >= 3
+        )  # [*] -> State1, State1 -> State2, State2 -> [*]
+
+        # Verify notes exist
+        assert len(result.notes) == 3
+
+        # Check note contents
+        note_contents = {note.content for note in result.notes}
+        assert "note1" in note_contents
+        assert "note2" in note_contents
+        assert "This is the note to the left." in note_contents
+
+        # Verify note positions and targets
+        notes_by_target = {}
+        for note in result.notes:
+            notes_by_target.setdefault(note.target_state.id_, []).append(note)
+        state1_notes = notes_by_target.get("State1", [])
+        state2_notes = notes_by_target.get("State2", [])
+
+        assert len(state1_notes) == 2
+        assert len(state2_notes) == 1
+
+        # Check positions
+        assert all(note.position == "right of" for note in state1_notes)
+        assert state2_notes[0].position == "left of"
+
+        assert _norm(result.script) == _norm(_EXPECTED_NOTES_SCRIPT)
+
+    @pytest.mark.parametrize(
+        "mermaid_text,expected_parents",
+        PARENT_ID_CASES,
+        ids=["composite", "nested_composite", "sibling_composites"],
+    )
+    def test_parent_id(self, converter, mermaid_text, expected_parents):
+        """Test that parentId is set for states defined in a composite, and only for them"""
         result = converter.convert(mermaid_text)
 
+        states_by_id = _by_id(result.states)
+        for state_id, expected_parent in expected_parents:
+            _assert_parent(states_by_id, state_id, expected_parent)
+
+    def test_initial_state_extraction(self, converter):
+        """Test that root_initial_state and initial_states are correctly extracted"""
+        result = converter.convert(_MERMAID_INITIAL_STATES)
+
         # Test root initial state
         assert (
             result.root_initial_state == "Off"
@@ -278,3 +265,61 @@ stateDiagram-v2
         assert (
             result.initial_states["LoggedIn"] == "Idle"
         ), f"LoggedIn's initial state should be 'Idle', got '{result.initial_states.get('LoggedIn')}'"
+
+    def test_convert_empty_state_diagram(self, converter):
+        """Test that a diagram without statements converts to an empty result"""
+        result = converter.convert("stateDiagram-v2")
+
+        assert isinstance(result, StateDiagramWithNote)
+        assert result.states == []
+        assert result.transitions == []
+        assert result.notes == []
+        assert result.root_initial_state is None
+
+    def test_convert_many_matches_convert(self, converter):
+        """Test that batch conversion in worker processes keeps order and results"""
+        # The only test that spawns worker interpreters: keep other batch tests serial
+        mermaid_texts = [
+            "stateDiagram-v2\n    [*] --> A\n    A --> B",
+            "stateDiagram-v2\n    [*] --> C\n    C --> [*]",
+            "stateDiagram-v2\n    state P {\n        [*] --> Q\n    }\n    [*] --> P",
+        ]
+
+        results = converter.convert_many(mermaid_texts, workers=2)
+
+        assert [result.script for result in results] == [
+            StateDiagramConverter().convert(text).script for text in mermaid_texts
+        ]
+
+    def test_result_state_indexes(self, converter):
+        """Test that the result indexes states by id and by parent id"""
+        result = converter.convert(_MERMAID_SINGLE_COMPOSITE)
+
+        assert set(result.states_by_id) == {"Idle", "Active", "Working", "Paused"}
+        assert [state.parent_id for state in result.states_by_id["Working"]] == [
+            "Active"
+        ]
+        assert {state.id_ for state in result.children_by_parent["Active"]} == {
+            "Working",
+            "Paused",
+        }
+        assert {state.id_ for state in result.children_by_parent[None]} == {
+            "Idle",
+            "Active",
+        }
+
+    def test_result_states_by_id_keeps_ids_reused_across_regions(self, converter):
+        """Test that states sharing an id in parallel regions are all indexed"""
+        result = converter.convert(_MERMAID_REGIONS_SHARED_ID)
+
+        idle_states = result.states_by_id["Idle"]
+        assert len(idle_states) == 2
+        assert [state.scoped_id for state in idle_states] == [
+            "Active_region_0_Idle",
+            "Active_region_1_Idle",
+        ]
+        assert {state.id_ for state in result.children_by_parent["Active"]} == {
+            "Idle",
+            "Typing",
+            "Blinking",
+        }